@@ -1,19 +1,50 @@
 import dash
-from dash import html, dcc, Input, Output, State
+from dash.exceptions import PreventUpdate
+from dash import html, dcc, dash_table, Input, Output, State
+from dash.dash_table.Format import Format, Group, Scheme, Sign, Symbol
 import dash_bootstrap_components as dbc
+import numpy as np
 import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import yfinance as yf
-# from functools import lru_cache # Replaced by diskcache
+import csv
+import functools
+import hashlib
 from datetime import datetime
+import nsepython.rahu
 from nsepython import nse_eq
 import time
-from dash.dependencies import ALL
+import threading
 import diskcache
+import asyncio
+import aiohttp
 import json
 import os
+import pickle
+import re
+
+try:
+    from numba import njit, prange
+except ImportError:  # Optional - derived columns fall back to NumPy
+    njit = None
+
+# Initialize persistent cache - sharded so concurrent fetch threads don't
+# serialize on a single SQLite writer lock
+cache = diskcache.FanoutCache(
+    "./cache_dir", shards=8, timeout=1, disk_pickle_protocol=pickle.HIGHEST_PROTOCOL, tag_index=True
+)
+
+# Entry tags: a manual refresh evicts PRICES_TAG and leaves the slow-moving
+# STATIC_TAG entries (industries, EPS, share counts) in place
+PRICES_TAG = "prices"
+STATIC_TAG = "static"
+
+
+class _NoData(Exception):
+    """Raised inside a memoized fetcher so a failed lookup is not cached."""
 
-# Initialize persistent cache
-cache = diskcache.Cache("./cache_dir")
 
 # -------------------------------------------------------------------
 # SAFETY WRAPPER
@@ -22,31 +53,63 @@ def safe_dict(value):
     return value if isinstance(value, dict) else {}
 
 
+_COMMA_DROP = str.maketrans("", "", ",")
+
+
 def safe_float(v):
     """Try to convert v to float, return None if not possible (handles 'NA', None, empty)."""
+    # Exact-type checks first: plain floats/ints are by far the common case
+    t = type(v)
+    if t is float:
+        return v if v == v else None  # NaN from pandas frames
+    if t is int:
+        return float(v)
+    if v is None:
+        return None
+    if isinstance(v, (int, float)):  # bool, NumPy floats
+        return float(v) if v == v else None
+    return _parse_float_str(v if t is str else str(v))
+
+
+@functools.lru_cache(maxsize=4096)
+def _parse_float_str(s: str):
+    """safe_float for strings; NSE repeats the same few values ("NA", "-", prices) a lot."""
+    s = s.strip()
+    if not s or s.upper() == "NA":
+        return None
     try:
-        if v is None:
-            return None
-        if isinstance(v, (int, float)):
-            return float(v)
-        s = str(v).strip()
-        if s == "" or s.upper() == "NA":
-            return None
-        s = s.replace(",", "")
-        return float(s)
-    except Exception:
+        return float(s.translate(_COMMA_DROP))
+    except ValueError:
         return None
 
 
-def retry_with_backoff(func, symbol: str, max_retries: int = 3, base_delay: float = 1.0):
-    """Retry a function with exponential backoff for rate limit errors."""
+def coerce_numeric(df, cols):
+    """Batch version of safe_float: coerce whole columns, unparseable values become NaN."""
+    for c in cols:
+        if c not in df.columns or pd.api.types.is_numeric_dtype(df[c]):
+            continue  # already numeric - nothing to clean
+        # Only string/object columns need the thousands separators stripped
+        df[c] = pd.to_numeric(df[c].astype(str).str.replace(",", "", regex=False), errors="coerce")
+    return df
+
+
+# Errors that mean "slow down": explicit rate limits, or NSE/Yahoo answering
+# with an HTML block page (JSON decode fails) or a spurious "delisted"
+RATE_RE = re.compile(r"rate|429|expecting value|delisted", re.IGNORECASE)
+
+
+def retry_with_backoff(func, symbol: str, max_retries: int = 3, base_delay: float = 1.0, limiter=None):
+    """Retry a function with exponential backoff for rate limit errors.
+
+    A rate-limited attempt also drains ``limiter`` so other threads back off too.
+    """
     for attempt in range(max_retries):
         try:
             return func(symbol)
         except Exception as e:
-            err_str = str(e).lower()
-            # Handle JSON decode error (often means blocking/rate limit) or explicit rate limit
-            if "expecting value" in err_str or "rate" in err_str or "429" in err_str:
+            if RATE_RE.search(str(e)):
+                if limiter is not None:
+                    limiter.drain()
                 if attempt < max_retries - 1:
                     delay = base_delay * (2 ** attempt)
                     print(f"  [Retry {attempt+1}/{max_retries}] Issue with {symbol} ({e}), waiting {delay:.1f}s...")
@@ -61,20 +124,195 @@ def retry_with_backoff(func, symbol: str, max_retries: int = 3, base_delay: floa
     return None
 
 
+class TokenBucket:
+    """Thread-safe token bucket: ``rate`` requests per second, bursts of up to ``burst``."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self):
+        """Reserve one token and return how many seconds to wait before using it."""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+            self.tokens -= 1
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def wait(self):
+        delay = self.take()
+        if delay > 0:
+            time.sleep(delay)
+
+    def drain(self):
+        """Drop any banked burst after a rate-limit response."""
+        with self.lock:
+            self.tokens = min(self.tokens, 0.0)
+            self.last = time.monotonic()
+
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Small thread-safe in-memory cache whose entries expire ``ttl`` seconds after being set.
+
+    With ``maxsize`` the least recently set entries are dropped once it is exceeded.
+    """
+
+    def __init__(self, ttl: float, maxsize: int = None):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.d = {}
+        self.lock = threading.RLock()
+
+    def get(self, key, default=_MISSING):
+        with self.lock:
+            item = self.d.get(key)
+            if item is None:
+                return default
+            expires_at, value = item
+            if time.monotonic() >= expires_at:
+                del self.d[key]
+                return default
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.d.pop(key, None)
+            self.d[key] = (time.monotonic() + self.ttl, value)
+            if self.maxsize is not None and len(self.d) > self.maxsize:
+                del self.d[next(iter(self.d))]
+
+    def delete(self, key):
+        with self.lock:
+            self.d.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.d.clear()
+
+
+def memory_cached(ttl: float, maxsize: int = 256):
+    """In-process TTL layer in front of a diskcache-memoized function.
+
+    Hot reads skip the SQLite lookup and unpickling entirely; each entry
+    expires on its own clock rather than on a shared bucket boundary.
+    ``maxsize`` bounds the entries left behind by keys that are never read again.
+    """
+    def decorator(func):
+        ttl_cache = TTLCache(ttl, maxsize=maxsize)
+
+        @functools.wraps(func)
+        def wrapper(*args):
+            value = ttl_cache.get(args)
+            if value is _MISSING:
+                value = func(*args)
+                ttl_cache.set(args, value)
+            return value
+
+        wrapper.cache = ttl_cache
+        wrapper.cache_clear = ttl_cache.clear
+        return wrapper
+    return decorator
+
+
+# -------------------------------------------------------------------
+# SHARED YFINANCE / NSE SESSIONS
+# -------------------------------------------------------------------
+# One keep-alive session for every yfinance call, so the TLS connection and
+# Yahoo's cookie/crumb are negotiated once instead of per Ticker
+YF_SESSION = requests.Session()
+YF_SESSION.headers["User-Agent"] = "Mozilla/5.0"
+
+# Paces Yahoo requests the same way NSE_LIMITER paces NSE
+YF_LIMITER = TokenBucket(rate=2, burst=4)
+
+_TICKERS = {}
+
+
+def get_ticker(symbol: str):
+    """Return a cached yf.Ticker for an NSE symbol, bound to YF_SESSION."""
+    tk = _TICKERS.get(symbol)
+    if tk is None:
+        tk = _TICKERS.setdefault(symbol, yf.Ticker(symbol + ".NS", session=YF_SESSION))
+    return tk
+
+
+NSE_BASE_URL = "https://www.nseindia.com"
+NSE_QUOTE_URL = NSE_BASE_URL + "/api/quote-equity?symbol={}"
+NSE_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+                  "(KHTML, like Gecko) Chrome/120.0 Safari/537.36",
+    "Accept": "application/json, text/plain, */*",
+    "Accept-Language": "en-US,en;q=0.9",
+    "Referer": NSE_BASE_URL + "/",
+}
+
+
+# One keep-alive session for every NSE call. nse_eq looks nsefetch up as a
+# module global, so pointing that at nse_session_fetch routes its quotes
+# through this session too instead of a fresh connection per call
+NSE_SESSION = requests.Session()
+NSE_SESSION.headers.update(NSE_HEADERS)
+# Dropped/reset connections are retried at the transport level; rate limits
+# are handled by NSE_LIMITER and retry_with_backoff instead
+NSE_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=20, pool_maxsize=20, max_retries=Retry(total=2, backoff_factor=0.5, status=0),
+))
+
+# Paces every NSE API call across threads (and the async prefetch) instead of
+# fixed sleeps; a rate-limit response drains it
+NSE_LIMITER = TokenBucket(rate=5, burst=10)
+
+
+def nse_session_fetch(url: str):
+    """nsefetch over NSE_SESSION; seeds the NSE cookies once if the API call is blocked."""
+    NSE_LIMITER.wait()
+    try:
+        return NSE_SESSION.get(url, timeout=10).json()
+    except ValueError:
+        # Blocked requests come back as an HTML page - visit the home page for cookies
+        NSE_SESSION.get(NSE_BASE_URL, timeout=10)
+        NSE_LIMITER.wait()
+        return NSE_SESSION.get(url, timeout=10).json()
+
+
+nsepython.rahu.nsefetch = nse_session_fetch
+
+
 # -------------------------------------------------------------------
 # 1) Load pre-generated symbol-industry mapping (FAST!)
 # -------------------------------------------------------------------
-@cache.memoize(expire=86400)  # Cache for 24 hours
+SYMBOLS_CSV = "nifty100_with_industries.csv"
+
+
 def load_symbols_with_industries():
-    """Load symbols and industries from pre-generated CSV - INSTANT LOAD!"""
+    """Load symbols and industries from pre-generated CSV - INSTANT LOAD!
+
+    The parsed map is persisted per file version, so restarts skip the CSV
+    parse and a regenerated CSV is picked up straight away.
+    """
     try:
-        # Load from the pre-generated CSV with industries
-        df = pd.read_csv("nifty100_with_industries.csv")
-        
-        print(f"✓ Loaded {len(df)} symbols with industries from CSV")
+        mtime = os.path.getmtime(SYMBOLS_CSV)
+    except OSError:
+        mtime = None
+    return _read_symbols_csv(mtime)
+
+
+@cache.memoize(expire=86400, tag=STATIC_TAG)  # Cache for 24 hours, keyed by file mtime
+def _read_symbols_csv(mtime):
+    try:
+        # Load from the pre-generated CSV with industries - two plain string
+        # columns, so the stdlib reader is enough (no DataFrame round trip)
+        with open(SYMBOLS_CSV, newline="", encoding="utf-8") as f:
+            symbol_industry_map = {row["symbol"]: row["industry"] for row in csv.DictReader(f)}
         
-        # Create symbol -> industry mapping
-        symbol_industry_map = dict(zip(df["symbol"], df["industry"]))
+        print(f"✓ Loaded {len(symbol_industry_map)} symbols with industries from CSV")
         
         # Remove N/A entries if you want
         # symbol_industry_map = {k: v for k, v in symbol_industry_map.items() if v != "N/A"}
@@ -98,152 +336,440 @@ SYMBOL_INDUSTRY_MAP = {}
 # -------------------------------------------------------------------
 # 2) CONSOLIDATED NSE DATA FETCH
 # -------------------------------------------------------------------
-@cache.memoize(expire=1800)  # Cache for 30 minutes
 def get_nse_data(symbol: str):
-    """Fetch full NSE data once and cache."""
+    """Fetch full NSE data once and cache; failures are retried on the next call."""
+    try:
+        return _nse_quote(symbol)
+    except _NoData:
+        return None
+
+
+@cache.memoize(expire=1800, tag=PRICES_TAG)  # Cache for 30 minutes - also feeds live-price fallbacks
+def _nse_quote(symbol: str):
     def _fetch(s):
         return nse_eq(s)
     
-    return retry_with_backoff(_fetch, symbol, max_retries=3, base_delay=2.0)
+    data = retry_with_backoff(_fetch, symbol, max_retries=3, base_delay=2.0, limiter=NSE_LIMITER)
+    if not data:
+        raise _NoData(symbol)
+    return data
+
+
+async def _nse_json(session, sem, symbol: str, refresh_cookies, max_retries: int = 3, base_delay: float = 2.0):
+    """Async equivalent of nse_eq: the same quote-equity request, with backoff on 429.
+
+    A 401/403 means NSE's cookies are missing or stale; they are refreshed
+    once and the request retried.
+    """
+    url = NSE_QUOTE_URL.format(requests.utils.quote(symbol, safe=""))
+    cookies_refreshed = False
+    for attempt in range(max_retries):
+        try:
+            async with sem:
+                await asyncio.sleep(NSE_LIMITER.take())
+                async with session.get(url) as resp:
+                    status = resp.status
+                    if status not in (401, 403, 429) or (status != 429 and cookies_refreshed):
+                        resp.raise_for_status()
+                        return await resp.json(content_type=None)
+            if status != 429:
+                cookies_refreshed = True
+                await refresh_cookies()
+                continue
+        except Exception as e:
+            print(f"  Error fetching {symbol}: {e}")
+            return None
+        NSE_LIMITER.drain()
+        if attempt < max_retries - 1:
+            delay = base_delay * (2 ** attempt)
+            print(f"  [Retry {attempt+1}/{max_retries}] Rate limited on {symbol}, waiting {delay:.1f}s...")
+            await asyncio.sleep(delay)
+    print(f"  Max retries exceeded for {symbol}")
+    return None
+
+
+async def _gather_nse(symbols, limit: int):
+    """Fetch quotes for all symbols on one event loop over a single keep-alive session."""
+    sem = asyncio.Semaphore(limit)
+    connector = aiohttp.TCPConnector(limit=20)
+    timeout = aiohttp.ClientTimeout(total=30)
+    # Reuse the cookies NSE_SESSION already holds from earlier NSE requests
+    cookies = NSE_SESSION.cookies.get_dict()
+    async with aiohttp.ClientSession(
+        headers=NSE_HEADERS, cookies=cookies, connector=connector, timeout=timeout
+    ) as session:
+        lock = asyncio.Lock()
+        visited = []
+
+        async def refresh_cookies():
+            # NSE rejects API calls without the cookies set by the home page;
+            # visit it at most once per prefetch, however many requests hit a 401
+            async with lock:
+                if not visited:
+                    session.cookie_jar.clear()
+                    async with session.get(NSE_BASE_URL) as resp:
+                        await resp.read()
+                    visited.append(True)
+
+        if not cookies:
+            await refresh_cookies()
+        return await asyncio.gather(*(_nse_json(session, sem, s, refresh_cookies) for s in symbols))
+
+
+def prefetch_nse_quotes(symbols, limit: int = 8):
+    """Warm the get_nse_data cache for every symbol not already cached.
+
+    The quotes are fetched concurrently on one thread, so the worker pool
+    afterwards only reads from cache.
+    """
+    today = datetime.now().strftime("%Y-%m-%d")
+    missing = [
+        s for s in dict.fromkeys(symbols)
+        if _static_fundamentals.__cache_key__(s, today) not in cache
+        and _nse_quote.__cache_key__(s) not in cache
+    ]
+    if not missing:
+        return 0
+
+    try:
+        results = asyncio.run(_gather_nse(missing, limit))
+    except Exception as e:
+        # Leave the cache cold; get_nse_data falls back to nse_eq per symbol
+        print(f"  Async NSE prefetch failed: {e}")
+        return 0
+
+    fetched = 0
+    for symbol, data in zip(missing, results):
+        if data:
+            cache.set(_nse_quote.__cache_key__(symbol), data, expire=1800, tag=PRICES_TAG)
+            fetched += 1
+    print(f"✓ Prefetched {fetched}/{len(missing)} NSE quotes")
+    return fetched
 
 
 # -------------------------------------------------------------------
-# 3) FUNDAMENTALS for single stock
+# 3) NIFTY 100 SNAPSHOT (all constituents in one request)
 # -------------------------------------------------------------------
-@cache.memoize(expire=1800)  # Cache for 30 minutes
-def get_fundamentals(symbol: str):
-    try:
-        data = get_nse_data(symbol)
-        if not data:
-            return None
+NIFTY100_SNAPSHOT_URL = "https://www.nseindia.com/api/equity-stockIndices?index=NIFTY%20100"
+SNAPSHOT_NUMERIC_COLS = [
+    "open", "dayHigh", "dayLow", "lastPrice", "previousClose", "change", "pChange",
+    "totalTradedVolume", "yearHigh", "yearLow",
+]
+
+
+@memory_cached(ttl=10, maxsize=1)
+@cache.memoize(expire=60, tag=PRICES_TAG)  # Cache for 1 minute - live prices
+def get_nifty100_snapshot():
+    """Fetch live quotes for every NIFTY 100 constituent, indexed by symbol."""
+    def _fetch(url):
+        return nse_session_fetch(url)
+
+    payload = retry_with_backoff(_fetch, NIFTY100_SNAPSHOT_URL, max_retries=3, base_delay=2.0, limiter=NSE_LIMITER)
+
+    # The first row is the index itself, not a constituent
+    rows = [
+        row for row in safe_dict(payload).get("data", [])
+        if isinstance(row, dict) and row.get("symbol") and row.get("symbol") != "NIFTY 100"
+    ]
+    if not rows:
+        raise _NoData(NIFTY100_SNAPSHOT_URL)
+
+    df = pd.DataFrame(rows).drop_duplicates("symbol").set_index("symbol")
+    return coerce_numeric(df, SNAPSHOT_NUMERIC_COLS)
 
-        meta = safe_dict(data.get("metadata"))
-        sec_info = safe_dict(data.get("securityInfo"))
-        price_info = safe_dict(data.get("priceInfo"))
-        industry = safe_dict(data.get("industryInfo"))
 
-        pe = safe_float(meta.get("pdSymbolPe") or meta.get("pdSectorPe"))
-        last_price = safe_float(price_info.get("lastPrice") or price_info.get("close"))
+# -------------------------------------------------------------------
+# 4) FUNDAMENTALS for single stock
+# -------------------------------------------------------------------
+def _parse_quote(data):
+    """Extract fundamentals from a per-symbol nse_eq payload."""
+    meta = safe_dict(data.get("metadata"))
+    sec_info = safe_dict(data.get("securityInfo"))
+    price_info = safe_dict(data.get("priceInfo"))
+    industry = safe_dict(data.get("industryInfo"))
 
+    pe = safe_float(meta.get("pdSymbolPe") or meta.get("pdSectorPe"))
+    last_price = safe_float(price_info.get("lastPrice") or price_info.get("close"))
+
+    eps = None
+    try:
+        if pe is not None and last_price is not None and pe != 0:
+            eps = last_price / pe
+    except Exception:
         eps = None
-        try:
-            if pe is not None and last_price is not None and pe != 0:
-                eps = last_price / pe
-        except Exception:
-            eps = None
 
+    mcap = None
+    issued = sec_info.get("issuedSize") or sec_info.get("issuedShares") or sec_info.get("issuedCapital")
+    issued_f = safe_float(issued)
+    try:
+        if issued_f is not None and last_price is not None:
+            mcap = issued_f * last_price
+    except Exception:
         mcap = None
-        issued = sec_info.get("issuedSize") or sec_info.get("issuedShares") or sec_info.get("issuedCapital")
-        issued_f = safe_float(issued)
-        try:
-            if issued_f is not None and last_price is not None:
-                mcap = issued_f * last_price
-        except Exception:
-            mcap = None
 
-        sector = industry.get("industry") or industry.get("sector")
-        week = safe_dict(price_info.get("weekHighLow"))
+    sector = industry.get("industry") or industry.get("sector")
+    week = safe_dict(price_info.get("weekHighLow"))
+
+    return {
+        "P/E": round(pe, 2) if pe is not None else None,
+        "EPS": eps,  # unrounded: P/E is recomputed from it; the table rounds for display
+        "Market Cap": round(mcap, 2) if mcap is not None else None,
+        "Sector": sector or "N/A",
+        "52W High": safe_float(week.get("max")),
+        "52W Low": safe_float(week.get("min")),
+        "lastPrice": last_price,
+        "previousClose": safe_float(price_info.get("previousClose") or price_info.get("close")),
+        "open": safe_float(price_info.get("open")),
+        "issuedSize": issued_f,
+    }
+
+
+def get_static_fundamentals(symbol: str):
+    """Slow-moving fields (EPS, issued shares, sector) from the per-symbol quote.
+
+    Cached per calendar day, so results published overnight are picked up on
+    the first fetch of the next day rather than up to 24h later.
+    """
+    try:
+        return _static_fundamentals(symbol, datetime.now().strftime("%Y-%m-%d"))
+    except _NoData:
+        return None
+
+
+@cache.memoize(expire=86400, tag=STATIC_TAG)  # Cache for 24 hours, keyed by day
+def _static_fundamentals(symbol: str, day: str):
+    data = get_nse_data(symbol)
+    if not data:
+        raise _NoData(symbol)
+
+    quote = _parse_quote(data)
+    return {
+        "EPS": quote["EPS"],
+        "issuedSize": quote["issuedSize"],
+        "Sector": quote["Sector"],
+    }
+
+
+LIVE_FIELDS = ("lastPrice", "previousClose", "open", "52W High", "52W Low", "Sector")
+
+
+def live_snapshot():
+    """The NIFTY 100 snapshot, or an empty frame if NSE didn't return one (not cached)."""
+    try:
+        return get_nifty100_snapshot()
+    except _NoData:
+        return pd.DataFrame()
+
+
+def get_live_price(symbol: str, snapshot=None):
+    """Fast-moving fields (last price, previous close, open, 52W range) from the index snapshot.
 
+    Pass ``snapshot`` to index into a frame already read for this fetch.
+    """
+    try:
+        if snapshot is None:
+            snapshot = live_snapshot()
+        if symbol not in snapshot.index:
+            # Not in the index snapshot - fall back to the per-symbol quote
+            data = get_nse_data(symbol)
+            if not data:
+                return None
+            quote = _parse_quote(data)
+            return {key: quote[key] for key in LIVE_FIELDS}
+
+        # The 52W range rides along in the same snapshot row, so it stays
+        # current on days a new high/low is set
+        row = snapshot.loc[symbol]
         return {
-            "P/E": round(pe, 2) if pe is not None else None,
-            "EPS": round(eps, 2) if eps is not None else None,
-            "Market Cap": round(mcap, 2) if mcap is not None else None,
-            "Sector": sector or "N/A",
-            "52W High": week.get("max"),
-            "52W Low": week.get("min"),
-            "priceInfo": price_info,
-            "lastPrice": last_price,
+            "lastPrice": safe_float(row.get("lastPrice")),
+            "previousClose": safe_float(row.get("previousClose")),
+            "open": safe_float(row.get("open")),
+            "52W High": safe_float(row.get("yearHigh")),
+            "52W Low": safe_float(row.get("yearLow")),
+            "Sector": safe_dict(row.get("meta")).get("industry"),
         }
 
     except Exception as e:
-        print("Fundamental Fetch Error:", e)
+        print("Live Price Fetch Error:", e)
         return None
 
 
 # -------------------------------------------------------------------
-# 4) HISTORICAL PRICE COMPARISON
+# 5) PRICE / VOLUME HISTORY
 # -------------------------------------------------------------------
-@cache.memoize(expire=3600)  # Cache for 1 hour
-def get_historical_comparison(symbol: str, days: int):
-    """Get price comparison for N days ago."""
-    try:
-        tk = yf.Ticker(symbol + ".NS")
-        
-        # Fetch historical data - get extra days to account for weekends/holidays
-        hist = tk.history(period=f"{days + 10}d", interval="1d")
-        
-        if hist.empty or len(hist) < 2:
-            return None, None, None
-        
-        # Get current price (most recent)
-        current_price = float(hist['Close'].iloc[-1])
-        
-        # Get price from N days ago (or closest available)
-        if len(hist) >= days:
-            old_price = float(hist['Close'].iloc[-days])
-        else:
-            # Use oldest available if not enough data
-            old_price = float(hist['Close'].iloc[0])
-        
-        # Calculate change
-        price_change = current_price - old_price
-        price_change_pct = (price_change / old_price * 100) if old_price != 0 else None
-        
-        return old_price, price_change, price_change_pct
-        
-    except Exception as e:
-        print(f"Historical data error for {symbol}: {e}")
+def _price_comparison(close, days: int):
+    """Compare the latest close against the close N trading days ago."""
+    if close is None or len(close) < 2:
         return None, None, None
 
+    current_price = float(close.iloc[-1])
+    if len(close) >= days:
+        old_price = float(close.iloc[-days])
+    else:
+        old_price = float(close.iloc[0])
 
-# -------------------------------------------------------------------
-# 5) VOLUME STATS
-# -------------------------------------------------------------------
-@cache.memoize(expire=1800)  # Cache for 30 minutes
-def get_volume_stats(symbol: str):
-    """Return volume metrics with retry backoff for rate limits."""
-    
-    def _fetch_volume(sym):
-        tk = yf.Ticker(sym + ".NS")
-        
-        avg_vol = None
-        try:
-            hist_30 = tk.history(period="30d", interval="1d")
-            if "Volume" in hist_30.columns and not hist_30["Volume"].empty:
-                avg_vol = float(hist_30["Volume"].mean())
-        except Exception as e:
-            print(f"  Avg volume fetch error for {sym}: {e}")
+    price_change = current_price - old_price
+    price_change_pct = (price_change / old_price * 100) if old_price != 0 else None
 
-        todays_vol = None
-        try:
-            intraday = tk.history(period="1d", interval="1m")
-            if "Volume" in intraday.columns and not intraday["Volume"].empty:
-                todays_vol = float(intraday["Volume"].sum())
-        except Exception:
-            try:
-                daily = tk.history(period="1d", interval="1d")
-                if "Volume" in daily.columns and not daily["Volume"].empty:
-                    todays_vol = float(daily["Volume"].iloc[-1])
-            except Exception:
-                todays_vol = None
+    return old_price, price_change, price_change_pct
 
-        vol_change_pct = None
-        try:
-            if avg_vol and todays_vol is not None and avg_vol != 0:
-                vol_change_pct = (todays_vol - avg_vol) / avg_vol * 100.0
-        except Exception:
-            pass
 
-        return {
-            "avg_volume": avg_vol,
-            "todays_volume": todays_vol,
-            "volume_change_pct": vol_change_pct,
-        }
-    
-    return retry_with_backoff(_fetch_volume, symbol, max_retries=3, base_delay=0.5) or {
-        "avg_volume": None,
-        "todays_volume": None,
-        "volume_change_pct": None,
+def _volume_metrics(daily_vol, todays_vol=None):
+    """Average volume over the last 30 days vs today's volume."""
+    avg_vol = None
+    if daily_vol is not None and not daily_vol.empty:
+        recent = daily_vol[daily_vol.index >= daily_vol.index[-1] - pd.Timedelta(days=30)]
+        avg_vol = float(recent.mean())
+        if todays_vol is None:
+            todays_vol = float(daily_vol.iloc[-1])
+
+    vol_change_pct = None
+    if avg_vol and todays_vol is not None:
+        vol_change_pct = (todays_vol - avg_vol) / avg_vol * 100.0
+
+    return {
+        "avg_volume": avg_vol,
+        "todays_volume": todays_vol,
+        "volume_change_pct": vol_change_pct,
+    }
+
+
+def _download_field(df, symbols, column):
+    """One field of a group_by="ticker" yf.download frame as a dates x symbols frame."""
+    if df is None or df.empty:
+        return pd.DataFrame()
+
+    if not isinstance(df.columns, pd.MultiIndex):
+        # Older yfinance returns flat columns for a single ticker
+        return df[[column]].set_axis(list(symbols[:1]), axis=1) if column in df.columns else pd.DataFrame()
+
+    try:
+        field = df.xs(column, axis=1, level=1)
+    except KeyError:
+        return pd.DataFrame()
+    field.columns = [c.removesuffix(".NS") for c in field.columns]
+    return field.dropna(axis=1, how="all")
+
+
+def bulk_volume_stats(daily_volumes, intraday_volumes):
+    """Vectorized _volume_metrics over every symbol column of a daily volume frame."""
+    if daily_volumes.empty:
+        return {}
+
+    recent = daily_volumes[daily_volumes.index >= daily_volumes.index[-1] - pd.Timedelta(days=30)]
+    avg_vol = recent.mean()
+    # Today's volume from the 1-minute bars, else the latest daily bar
+    todays_vol = intraday_volumes.reindex(avg_vol.index).fillna(daily_volumes.ffill().iloc[-1])
+    vol_change_pct = (todays_vol - avg_vol) / avg_vol.where(avg_vol != 0) * 100.0
+
+    stats = pd.DataFrame({
+        "avg_volume": avg_vol,
+        "todays_volume": todays_vol,
+        "volume_change_pct": vol_change_pct,
+    })
+    return stats.astype(object).where(stats.notna(), None).to_dict("index")
+
+
+def fetch_bulk_history(symbols: tuple, days: int):
+    """Download daily closes and volumes for all symbols in a single request.
+
+    Returns ``({symbol: close_series}, volume_frame)``; both empty if the
+    download failed (failures are not cached, so the next fetch retries).
+    """
+    try:
+        return _bulk_history(symbols, days)
+    except _NoData:
+        return {}, pd.DataFrame()
+
+
+@cache.memoize(expire=1800, tag=PRICES_TAG)  # Cache for 30 minutes
+def _bulk_history(symbols: tuple, days: int):
+    tickers = " ".join(s + ".NS" for s in symbols)
+
+    def _download(t):
+        YF_LIMITER.wait()
+        return yf.download(
+            tickers=t,
+            period=f"{max(days, 30) + 10}d",
+            interval="1d",
+            group_by="ticker",
+            auto_adjust=True,
+            threads=True,
+            progress=False,
+            session=YF_SESSION,
+        )
+
+    df = retry_with_backoff(_download, tickers, max_retries=3, base_delay=2.0, limiter=YF_LIMITER)
+    if df is None or df.empty:
+        raise _NoData(tickers)
+    closes = _download_field(df, symbols, "Close")
+    closes = {sym: closes[sym].dropna() for sym in closes.columns}
+    return closes, _download_field(df, symbols, "Volume")
+
+
+def fetch_bulk_intraday_volume(symbols: tuple):
+    """Download today's 1-minute bars for all symbols and sum their volume per symbol."""
+    try:
+        return _bulk_intraday_volume(symbols)
+    except _NoData:
+        return pd.Series(dtype="float64")
+
+
+@cache.memoize(expire=1800, tag=PRICES_TAG)  # Cache for 30 minutes
+def _bulk_intraday_volume(symbols: tuple):
+    tickers = " ".join(s + ".NS" for s in symbols)
+
+    def _download(t):
+        YF_LIMITER.wait()
+        return yf.download(
+            tickers=t,
+            period="1d",
+            interval="1m",
+            group_by="ticker",
+            threads=True,
+            progress=False,
+            session=YF_SESSION,
+        )
+
+    df = retry_with_backoff(_download, tickers, max_retries=3, base_delay=2.0, limiter=YF_LIMITER)
+    if df is None or df.empty:
+        raise _NoData(tickers)
+    return _download_field(df, symbols, "Volume").sum(min_count=1)
+
+
+HISTORY_FIELDS = (
+    "old_price", "price_change", "price_change_pct",
+    "avg_volume", "todays_volume", "volume_change_pct",
+)
+
+
+def get_history_bundle(symbol: str, days: int):
+    """Price comparison and volume stats for one symbol from a single history call."""
+    try:
+        return _history_bundle(symbol, days)
+    except _NoData:
+        # Not cached, so the columns fill in on the next fetch once Yahoo answers
+        return dict.fromkeys(HISTORY_FIELDS)
+
+
+@memory_cached(ttl=300, maxsize=512)  # ~5 day counts x 101 symbols
+@cache.memoize(expire=1800, tag=PRICES_TAG)  # Cache for 30 minutes
+def _history_bundle(symbol: str, days: int):
+    def _fetch(sym):
+        # Extra days account for weekends/holidays; 30 covers the volume average
+        YF_LIMITER.wait()
+        return get_ticker(sym).history(period=f"{max(days + 10, 30)}d", interval="1d")
+
+    hist = retry_with_backoff(_fetch, symbol, max_retries=3, base_delay=0.5, limiter=YF_LIMITER)
+    if hist is None or hist.empty:
+        raise _NoData(symbol)
+
+    old_price, price_change, price_change_pct = _price_comparison(hist["Close"].dropna(), days)
+    return {
+        "old_price": old_price,
+        "price_change": price_change,
+        "price_change_pct": price_change_pct,
+        **_volume_metrics(hist["Volume"].dropna()),
     }
 
 
@@ -252,58 +778,92 @@ def get_volume_stats(symbol: str):
 # -------------------------------------------------------------------
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
-
-def fetch_stocks_data_for_industry(symbols, days_comparison=10, batch_size: int = 10, workers: int = 2):
+# Per-symbol Yahoo fallbacks, overlapped with that symbol's NSE lookups
+_INNER_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix="aks-history")
+
+
+def _compute_derived_numpy(last, prev, issued, eps):
+    """1D change, 1D change %, market cap and P/E as NumPy column arithmetic."""
+    change = last - prev
+    with np.errstate(divide="ignore", invalid="ignore"):
+        change_pct = np.where(prev != 0, change / prev * 100, np.nan)
+        pe = np.where(eps != 0, last / eps, np.nan)
+    return change, change_pct, issued * last, pe
+
+
+if njit is not None:
+    @njit(cache=True, parallel=True)
+    def _compute_derived_jit(last, prev, issued, eps):
+        """Same outputs as _compute_derived_numpy, fused into one pass over the rows."""
+        n = last.shape[0]
+        change = np.empty(n)
+        change_pct = np.empty(n)
+        mcap = np.empty(n)
+        pe = np.empty(n)
+        for i in prange(n):
+            change[i] = last[i] - prev[i]
+            change_pct[i] = change[i] / prev[i] * 100 if prev[i] != 0 else np.nan
+            mcap[i] = issued[i] * last[i]
+            pe[i] = last[i] / eps[i] if eps[i] != 0 else np.nan
+        return change, change_pct, mcap, pe
+
+    compute_derived = _compute_derived_jit
+else:
+    compute_derived = _compute_derived_numpy
+
+
+def fetch_stocks_data_for_industry(symbols, days_comparison=10, workers: int = 2):
     """Fetch data for multiple stocks in parallel."""
     all_data = []
 
+    # Industry comes from the pre-generated CSV (the same map the dropdown
+    # filters on); the NSE quote's sector is only a fallback for gaps
+    sectors = {
+        sym: industry
+        for sym, industry in load_symbols_with_industries().items()
+        if industry != "N/A"
+    }
+
     def _fetch_one(symbol):
         try:
-            fund = get_fundamentals(symbol)
-            vol = get_volume_stats(symbol)
-            hist_price, hist_change, hist_change_pct = get_historical_comparison(symbol, days_comparison)
-            
-            if not fund:
-                return None
-
-            price_info = safe_dict(fund.get('priceInfo', {}))
-            last_price = fund.get('lastPrice')
-            prev_close = safe_float(price_info.get('previousClose') or price_info.get('close'))
-            today_open = safe_float(price_info.get('open'))
+            # Served from the bulk download; only fall back to a per-symbol
+            # Yahoo request for tickers missing from the bulk frame, and run
+            # it alongside the NSE lookups below rather than after them
+            history = None
+            if symbol not in closes or symbol not in volume_stats:
+                history = _INNER_POOL.submit(get_history_bundle, symbol, days_comparison)
+
+            live = get_live_price(symbol, snapshot)
+            # EPS and share count only change with results - daily quote cache
+            static = safe_dict(get_static_fundamentals(symbol)) if live else {}
+
+            if history is None:
+                hist_price, hist_change, hist_change_pct = _price_comparison(closes[symbol], days_comparison)
+                vol = volume_stats[symbol]
+            else:
+                vol = history.result()
+                hist_price, hist_change, hist_change_pct = vol['old_price'], vol['price_change'], vol['price_change_pct']
 
-            price_change = None
-            price_change_pct = None
-            try:
-                if last_price is not None and prev_close is not None:
-                    price_change = safe_float(last_price)
-                    if price_change is not None:
-                        price_change = price_change - prev_close
-                        if prev_close != 0:
-                            price_change_pct = (price_change / prev_close) * 100
-            except Exception:
-                price_change = None
-                price_change_pct = None
+            if not live:
+                return None
 
             stock_data = {
                 "SYMBOL": symbol,
                 "STOCK_NAME": symbol,
-                "INDUSTRIES": fund.get('Sector', 'N/A'),
-                "LAST_DAY_CLOSING_PRICE": prev_close,
-                "TODAY_PRICE_OPEN": today_open,
-                "TODAY_CURRENT_PRICE": last_price,
-                "TODAY_CURRENT_PRICE_CHANGE": price_change,
-                "TODAY_CURRENT_PRICE_CHANGE_PCT": price_change_pct,
+                "INDUSTRIES": sectors.get(symbol) or static.get('Sector') or live.get('Sector') or 'N/A',
+                "LAST_DAY_CLOSING_PRICE": live.get('previousClose'),
+                "TODAY_PRICE_OPEN": live.get('open'),
+                "TODAY_CURRENT_PRICE": live.get('lastPrice'),
                 "HISTORICAL_PRICE": hist_price,
                 "HISTORICAL_CHANGE": hist_change,
                 "HISTORICAL_CHANGE_PCT": hist_change_pct,
                 "TODAY_VOLUME_AVERAGE": vol.get('avg_volume'),
                 "TODAY_VOLUME": vol.get('todays_volume'),
                 "VOL_CHANGE_PCT": vol.get('volume_change_pct'),
-                "MARKET_CAP_CR": fund.get('Market Cap'),
-                "PE": fund.get('P/E'),
-                "EPS": fund.get('EPS'),
-                "52WEEK_HIGH": fund.get('52W High'),
-                "52WEEK_LOW": fund.get('52W Low'),
+                "ISSUED_SIZE": static.get('issuedSize'),
+                "EPS": static.get('EPS'),
+                "52WEEK_HIGH": live.get('52W High'),
+                "52WEEK_LOW": live.get('52W Low'),
             }
             return stock_data
         except Exception as e:
@@ -311,33 +871,146 @@ def fetch_stocks_data_for_industry(symbols, days_comparison=10, batch_size: int
             return None
 
     symbols = list(symbols)
-    for i in range(0, len(symbols), batch_size):
-        batch = symbols[i : i + batch_size]
-        batch_num = i // batch_size + 1
-        total_batches = (len(symbols) + batch_size - 1) // batch_size
-        print(f"\n[Batch {batch_num}/{total_batches}] Fetching {len(batch)} symbols...")
-        
-        with ThreadPoolExecutor(max_workers=min(workers, len(batch))) as ex:
-            futures = {ex.submit(_fetch_one, s): s for s in batch}
-            for fut in as_completed(futures):
-                res = None
-                try:
-                    res = fut.result()
-                except Exception as e:
-                    s = futures.get(fut)
-                    print(f"Executor error for {s}: {e}")
-                if res:
-                    all_data.append(res)
-        
-        if i + batch_size < len(symbols):
-            print(f"  Batch {batch_num} complete. Waiting 2s before next batch...")
-            time.sleep(2)
+    print(f"\nFetching {len(symbols)} symbols...")
+
+    # One yfinance request for the whole set instead of 2-3 per symbol
+    closes, daily_volumes = fetch_bulk_history(tuple(symbols), days_comparison)
+    volume_stats = bulk_volume_stats(daily_volumes, fetch_bulk_intraday_volume(tuple(symbols)))
+    # Live prices for the whole fetch come from one snapshot read, rather than
+    # one per worker on a cold cache
+    snapshot = live_snapshot()
+    # Quotes not yet in cache are fetched concurrently up front
+    prefetch_nse_quotes(symbols)
+
+    # A single pool for every symbol; results stream back as they complete
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        futures = {ex.submit(_fetch_one, s): s for s in symbols}
+        for fut in as_completed(futures):
+            res = None
+            try:
+                res = fut.result()
+            except Exception as e:
+                s = futures.get(fut)
+                print(f"Executor error for {s}: {e}")
+            if res:
+                all_data.append(res)
+
+    if not all_data:
+        return all_data
+
+    # Derived price columns in one vectorized pass over the assembled rows
+    df = coerce_numeric(
+        pd.DataFrame(all_data),
+        ["TODAY_CURRENT_PRICE", "LAST_DAY_CLOSING_PRICE", "ISSUED_SIZE", "EPS"],
+    )
+    change, change_pct, mcap, pe = compute_derived(
+        *(df[c].to_numpy(dtype=np.float64) for c in ("TODAY_CURRENT_PRICE", "LAST_DAY_CLOSING_PRICE", "ISSUED_SIZE", "EPS"))
+    )
+    df["TODAY_CURRENT_PRICE_CHANGE"] = change
+    df["TODAY_CURRENT_PRICE_CHANGE_PCT"] = change_pct
+    df["MARKET_CAP_CR"] = mcap.round(2)
+    df["PE"] = pe.round(2)
 
-    return all_data
+    return df.astype(object).where(df.notna(), None).to_dict("records")
 
 
 # -------------------------------------------------------------------
-# 6) DASH APP SETUP
+# 7) ASSEMBLED INDUSTRY BUNDLE (survives app restarts)
+# -------------------------------------------------------------------
+def bundle_cache_key(industry: str, days: int):
+    """Cache key for an assembled industry table, stable within a 10-minute bucket."""
+    bucket = datetime.now().strftime("%Y-%m-%d-%H%M")[:-1]
+    return f"bundle-cols:{industry}:{days}:{bucket}"
+
+
+# Fetches in progress, keyed by "industry:days"
+_FETCH_LOCKS = {}
+
+
+def fetch_lock(industry: str, days: int):
+    """Lock held while an industry/days bundle is being built."""
+    return _FETCH_LOCKS.setdefault(f"{industry}:{days}", threading.Lock())
+
+
+# Recently built/read bundles, so a table render or an overlapping refresh
+# doesn't re-read and unpickle the same bundle from disk. Kept short so other
+# workers pick up a manual refresh (which reuses the key) quickly
+_BUNDLE_MEMO = TTLCache(ttl=60, maxsize=16)
+
+
+def load_bundle(key: str):
+    """Cached bundle for ``key``, or None."""
+    bundle = _BUNDLE_MEMO.get(key, None)
+    if bundle is None:
+        bundle = cache.get(key)
+        if bundle is not None:
+            _BUNDLE_MEMO.set(key, bundle)
+    return bundle
+
+
+def fetch_industry_bundle(industry: str, days: int, symbols, refresh: bool = False):
+    """Return (cache key, {column: values}) for an industry, reading from disk when fresh.
+
+    The bundle is column-oriented and sorted by symbol, so the table builds its
+    frame straight from the lists and identical data always hashes the same.
+    """
+    key = bundle_cache_key(industry, days)
+    if refresh:
+        cache.delete(key)
+        _BUNDLE_MEMO.delete(key)
+
+    stocks_data = load_bundle(key)
+    if stocks_data is None:
+        rows = fetch_stocks_data_for_industry(symbols, days_comparison=days)
+        stocks_data = {}
+        if rows:
+            df = pd.DataFrame(rows).sort_values("SYMBOL")
+            stocks_data = df.astype(object).where(df.notna(), None).to_dict("list")
+        if stocks_data:
+            cache.set(key, stocks_data, expire=1800)  # Cache for 30 minutes
+            _BUNDLE_MEMO.set(key, stocks_data)
+    else:
+        print(f"  Using cached bundle {key} ({len(stocks_data['SYMBOL'])} stocks)")
+
+    return key, stocks_data
+
+
+# -------------------------------------------------------------------
+# 8) BACKGROUND REFRESH (opt-in with AKS_PREWARM=1)
+# -------------------------------------------------------------------
+REFRESH_INTERVAL = 180  # seconds; a rebuild only happens once the bundle bucket rolls over
+
+
+def prewarm_caches(days: int = 10):
+    """Build the "ALL" bundle so page loads read it from disk instead of fetching."""
+    symbols = list(load_symbols_with_industries().keys())
+    if not symbols:
+        return
+
+    print(f"[PREWARM] Warming caches for {len(symbols)} stocks...")
+    try:
+        # Held for the whole build so refresh callbacks keep serving the
+        # previous table instead of starting the same fetch
+        with fetch_lock("ALL", days):
+            _, stocks_data = fetch_industry_bundle("ALL", days, symbols)
+        print(f"[PREWARM] Done - {len(stocks_data.get('SYMBOL', []))} stocks cached")
+    except Exception as e:
+        print(f"[PREWARM] Failed: {e}")
+
+
+def _refresher_loop(days: int = 10, interval: float = REFRESH_INTERVAL):
+    """Keep the "ALL" bundle and the per-symbol caches behind it warm."""
+    while True:
+        prewarm_caches(days)
+        time.sleep(interval)
+
+
+if os.environ.get("AKS_PREWARM") == "1":
+    threading.Thread(target=_refresher_loop, name="aks-refresher", daemon=True).start()
+
+
+# -------------------------------------------------------------------
+# 9) DASH APP SETUP
 # -------------------------------------------------------------------
 app = dash.Dash(
     __name__, 
@@ -386,6 +1059,16 @@ app.index_string = '''
             .is-focused .Select-control {
                 border-color: #00D4FF !important;
             }
+            .table-message {
+                color: #888;
+                font-size: 1rem;
+                text-align: center;
+                margin-top: 50px;
+            }
+            .table-message.hint {
+                color: #00D4FF;
+                font-size: 1.2rem;
+            }
         </style>
     </head>
     <body>
@@ -426,6 +1109,7 @@ app.layout = dbc.Container([
                 type="number",
                 placeholder="Enter days (e.g., 10, 50, 200)",
                 value=10,
+                debounce=True,  # Fire on Enter/blur, not on every keystroke
                 min=1,
                 max=365,
                 style={
@@ -471,11 +1155,11 @@ app.layout = dbc.Container([
         disabled=True  # Will be enabled when industry is selected
     ),
     
-    dcc.Store(id="symbol-industry-map", data={}),
-    dcc.Store(id="stocks-data-store", data={}),
-    dcc.Store(id="current-days", data=10),
-    dcc.Store(id="sort-column", data=None),
-    dcc.Store(id="sort-direction", data="asc"),
+    dcc.Store(id="industry-symbols-map", data={}),
+    # Holds only the bundle cache key; rows stay server-side in diskcache
+    dcc.Store(id="stocks-data-store", data=None),
+    # Hash of the rows currently rendered in table-container
+    dcc.Store(id="table-hash", data=None),
     
     dbc.Row([
         dbc.Col([
@@ -497,7 +1181,7 @@ app.layout = dbc.Container([
 
 # Callback 1: Load initial symbol-industry mapping (INSTANT NOW!)
 @app.callback(
-    [Output("symbol-industry-map", "data"),
+    [Output("industry-symbols-map", "data"),
      Output("industry-filter", "options")],
     Input("industry-filter", "id")
 )
@@ -512,6 +1196,11 @@ def initialize_data(_):
         print("WARNING: No data loaded! Please run fetch_static_data.py first!")
         return {}, []
     
+    # Reverse index so selecting an industry is a dict lookup, not a scan
+    industry_symbols = {"ALL": list(SYMBOL_INDUSTRY_MAP.keys())}
+    for symbol, industry in SYMBOL_INDUSTRY_MAP.items():
+        industry_symbols.setdefault(industry, []).append(symbol)
+    
     industries = set(SYMBOL_INDUSTRY_MAP.values())
     industries.discard("N/A")
     
@@ -521,7 +1210,7 @@ def initialize_data(_):
     
     print(f"✓ Dropdown ready with {len(options)} options (including 'All')")
     
-    return SYMBOL_INDUSTRY_MAP, options
+    return industry_symbols, options
 
 
 # Callback 2: Enable/Disable refresh button and auto-refresh
@@ -537,40 +1226,43 @@ def toggle_refresh_and_interval(selected_industry):
 
 
 # Callback 3: Fetch data when industry selected, refreshed manually, or auto-refreshed
+# (renders the table too, so each tick is a single round trip)
 @app.callback(
     [Output("stocks-data-store", "data"),
      Output("update-timestamp", "children"),
-     Output("current-days", "data")],
+     Output("table-container", "children"),
+     Output("table-hash", "data")],
     [Input("industry-filter", "value"),
      Input("refresh-btn", "n_clicks"),
      Input("auto-refresh-interval", "n_intervals"),
      Input("days-input", "value")],
-    State("symbol-industry-map", "data"),
+    [State("industry-symbols-map", "data"),
+     State("stocks-data-store", "data"),
+     State("table-hash", "data")],
     running=[
         (Output("refresh-btn", "disabled"), True, False),
     ]
 )
-def fetch_industry_data(selected_industry, manual_clicks, auto_intervals, days_input, symbol_industry_map):
-    """Fetch stock data for the selected industry or all industries."""
+def fetch_industry_data(selected_industry, manual_clicks, auto_intervals, days_input, industry_symbols_map, current_key, current_hash):
+    """Fetch stock data for the selected industry or all industries and render the table."""
     
-    if not selected_industry or not symbol_industry_map:
-        return {}, "", 10
+    if not selected_industry or not industry_symbols_map:
+        return (None, "", *render_table(None, selected_industry, 10, current_hash))
     
     # Use default 10 days if invalid input
     days_comparison = days_input if days_input and days_input > 0 else 10
     
     # Determine if this was triggered by manual refresh or auto-refresh
-    ctx = dash.callback_context
+    # (dash.ctx.triggered_id is already parsed - no prop_id string handling)
+    trigger_id = dash.ctx.triggered_id
     trigger_source = "Initial Load"
     
-    if ctx.triggered:
-        trigger_id = ctx.triggered[0]['prop_id'].split('.')[0]
-        if trigger_id == "refresh-btn":
-            trigger_source = "Manual Refresh"
-        elif trigger_id == "auto-refresh-interval":
-            trigger_source = "Auto Refresh"
-        elif trigger_id == "days-input":
-            trigger_source = "Days Changed"
+    if trigger_id == "refresh-btn":
+        trigger_source = "Manual Refresh"
+    elif trigger_id == "auto-refresh-interval":
+        trigger_source = "Auto Refresh"
+    elif trigger_id == "days-input":
+        trigger_source = "Days Changed"
     
     # Clear caches on manual refresh or auto refresh
     if manual_clicks or auto_intervals > 0 or trigger_source == "Days Changed":
@@ -579,241 +1271,204 @@ def fetch_industry_data(selected_industry, manual_clicks, auto_intervals, days_i
         print(f"[{trigger_source.upper()}] Refreshing data (using cache if valid)...")
     
     # Get symbols for selected industry or all symbols
-    if selected_industry == "ALL":
-        symbols_in_industry = list(symbol_industry_map.keys())
-        display_name = "All Industries"
-    else:
-        symbols_in_industry = [symbol for symbol, industry in symbol_industry_map.items() 
-                              if industry == selected_industry]
-        display_name = selected_industry
+    symbols_in_industry = industry_symbols_map.get(selected_industry, [])
+    display_name = "All Industries" if selected_industry == "ALL" else selected_industry
     
     if not symbols_in_industry:
-        return {}, f"No stocks found for {display_name}", days_comparison
+        return (None, f"No stocks found for {display_name}", *render_table(None, selected_industry, days_comparison, current_hash))
+    
+    # Nothing to do if the table already shows a bundle that is still cached
+    if (
+        trigger_source != "Manual Refresh"
+        and current_key == bundle_cache_key(selected_industry, days_comparison)
+        and current_key in cache
+    ):
+        raise PreventUpdate
+    
+    # Refreshes skip if the same industry/days fetch is already running (e.g.
+    # auto-refresh landing during a manual refresh or the background refresher)
+    # and keep showing the current table; a first load waits for that fetch
+    # and then reads its bundle from cache
+    lock = fetch_lock(selected_industry, days_comparison)
+    if not lock.acquire(blocking=trigger_source in ("Initial Load", "Days Changed")):
+        print(f"[{trigger_source.upper()}] Fetch already in progress for {display_name}, skipping")
+        return dash.no_update, dash.no_update, dash.no_update, dash.no_update
     
+    try:
+        bundle_key, timestamp = _load_industry(selected_industry, display_name, symbols_in_industry, days_comparison, trigger_source)
+    finally:
+        lock.release()
+    
+    return (bundle_key, timestamp, *render_table(bundle_key, selected_industry, days_comparison, current_hash))
+
+
+def _load_industry(selected_industry, display_name, symbols_in_industry, days_comparison, trigger_source):
+    """Body of fetch_industry_data, run while holding the industry/days lock."""
     print(f"\n[FETCHING DATA - {trigger_source}] Loading {len(symbols_in_industry)} stocks for: {display_name} (comparing {days_comparison} days)")
     
-    # Fetch data with historical comparison
-    stocks_data = fetch_stocks_data_for_industry(symbols_in_industry, days_comparison=days_comparison)
+    if trigger_source == "Manual Refresh":
+        # Drop cached prices/volumes (memory and disk); static entries survive
+        for fn in (get_nifty100_snapshot, _history_bundle):
+            fn.cache_clear()
+        cache.evict(PRICES_TAG)
+    
+    # Fetch data with historical comparison (manual refresh bypasses the bundle cache)
+    bundle_key, stocks_data = fetch_industry_bundle(
+        selected_industry,
+        days_comparison,
+        symbols_in_industry,
+        refresh=(trigger_source == "Manual Refresh"),
+    )
     
     # Create timestamp with source indicator
     now = datetime.now().strftime("%H:%M:%S")
-    timestamp = f"Last updated: {now} | {len(stocks_data)} stocks | {days_comparison}D comparison | Next refresh: 5 min"
+    timestamp = f"Last updated: {now} | {len(stocks_data.get('SYMBOL', []))} stocks | {days_comparison}D comparison | Next refresh: 5 min"
     
-    return {selected_industry: stocks_data}, timestamp, days_comparison
+    # Empty results are never cached, so there is nothing to point the table at
+    if not stocks_data:
+        return None, timestamp
+    
+    return bundle_key, timestamp
 
 
-# Callback 4: Handle column sorting
-@app.callback(
-    [Output("sort-column", "data"),
-     Output("sort-direction", "data")],
-    Input({"type": "sort-button", "column": ALL}, "n_clicks"),
-    [State("sort-column", "data"),
-     State("sort-direction", "data")],
-    prevent_initial_call=True
+# -------------------------------------------------------------------
+# TABLE LAYOUT
+# -------------------------------------------------------------------
+CURRENCY_FORMAT = Format(
+    precision=2, scheme=Scheme.fixed, group=Group.yes, symbol=Symbol.yes, symbol_prefix="₹", nully="-"
+)
+MARKET_CAP_FORMAT = Format(
+    precision=2, scheme=Scheme.fixed, group=Group.yes, symbol=Symbol.yes, symbol_prefix="₹", symbol_suffix="Cr", nully="-"
+)
+NUMBER_FORMAT = Format(precision=2, scheme=Scheme.fixed, group=Group.yes, nully="-")
+VOLUME_FORMAT = Format(precision=0, scheme=Scheme.fixed, group=Group.yes, nully="-")
+PCT_FORMAT = Format(
+    precision=2, scheme=Scheme.fixed, sign=Sign.positive, symbol=Symbol.yes, symbol_suffix="%", nully="-"
 )
-def handle_sort(n_clicks_list, current_column, current_direction):
-    ctx = dash.callback_context
-    if not ctx.triggered:
-        return current_column, current_direction
 
-    # Extract which button triggered
-    triggered = ctx.triggered[0]["prop_id"].split(".")[0]
-    triggered_id = eval(triggered)   # Convert string dict to actual dict
+# (data key, header label, number format); "{days}" is filled in per render
+TABLE_COLUMNS = [
+    ("SYMBOL", "SYMBOL", None),
+    ("INDUSTRIES", "INDUSTRIES", None),
+    ("LAST_DAY_CLOSING_PRICE", "LAST CLOSE", CURRENCY_FORMAT),
+    ("TODAY_PRICE_OPEN", "OPEN", CURRENCY_FORMAT),
+    ("TODAY_CURRENT_PRICE", "CURRENT", CURRENCY_FORMAT),
+    ("TODAY_CURRENT_PRICE_CHANGE", "1D CHANGE", CURRENCY_FORMAT),
+    ("TODAY_CURRENT_PRICE_CHANGE_PCT", "1D CHANGE %", PCT_FORMAT),
+    ("HISTORICAL_PRICE", "{days}D PRICE", CURRENCY_FORMAT),
+    ("HISTORICAL_CHANGE", "{days}D CHANGE", CURRENCY_FORMAT),
+    ("HISTORICAL_CHANGE_PCT", "{days}D CHANGE %", PCT_FORMAT),
+    ("52WEEK_HIGH", "52W HIGH", CURRENCY_FORMAT),
+    ("52WEEK_LOW", "52W LOW", CURRENCY_FORMAT),
+    ("MARKET_CAP_CR", "MARKET CAP (Cr)", MARKET_CAP_FORMAT),
+    ("PE", "P/E", NUMBER_FORMAT),
+    ("EPS", "EPS", NUMBER_FORMAT),
+    ("TODAY_VOLUME_AVERAGE", "AVG VOLUME", VOLUME_FORMAT),
+    ("TODAY_VOLUME", "TODAY VOLUME", VOLUME_FORMAT),
+    ("VOL_CHANGE_PCT", "VOL CHANGE %", PCT_FORMAT),
+]
+TABLE_KEYS = [key for key, _, _ in TABLE_COLUMNS]
+PCT_KEYS = [key for key, _, fmt in TABLE_COLUMNS if fmt is PCT_FORMAT]
+# Decimals each numeric column is displayed with; values are rounded to this
+# before sending so the payload carries no digits the table never shows
+TABLE_DECIMALS = {
+    key: 0 if fmt is VOLUME_FORMAT else 2
+    for key, _, fmt in TABLE_COLUMNS if fmt is not None
+}
+
+# Fixed height so virtualization only renders the rows in view
+TABLE_STYLE = {"overflowX": "auto", "overflowY": "auto", "minWidth": "1200px", "height": "70vh"}
+TABLE_HEADER_STYLE = {
+    "backgroundColor": "#00D4FF",
+    "color": "#000",
+    "fontWeight": "700",
+    "padding": "10px",
+    "textAlign": "center",
+    "fontSize": "0.9rem",
+    "border": "none",
+}
+TABLE_CELL_STYLE = {
+    "backgroundColor": "#1a1a1a",
+    "color": "#fff",
+    "padding": "8px",
+    "textAlign": "right",
+    "border": "none",
+    "fontFamily": "inherit",
+    # Virtualized rows are laid out independently of the header, so columns
+    # need an explicit width to stay aligned
+    "minWidth": "95px",
+    "width": "95px",
+    "maxWidth": "160px",
+}
+TABLE_STYLE_DATA_CONDITIONAL = [
+    {"if": {"row_index": "even"}, "backgroundColor": "#2a2a2a"},
+    {"if": {"column_id": "SYMBOL"}, "color": "#00D4FF", "fontWeight": "700", "textAlign": "center"},
+    {"if": {"column_id": "INDUSTRIES"}, "fontSize": "0.9rem", "textAlign": "left"},
+    {"if": {"column_id": "TODAY_CURRENT_PRICE"}, "fontWeight": "700"},
+]
+for _key in PCT_KEYS:
+    TABLE_STYLE_DATA_CONDITIONAL += [
+        {"if": {"filter_query": f"{{{_key}}} >= 0", "column_id": _key}, "color": "#00cc66", "fontWeight": "700"},
+        {"if": {"filter_query": f"{{{_key}}} < 0", "column_id": _key}, "color": "#ff4d4d", "fontWeight": "700"},
+    ]
 
-    column = triggered_id["column"]
 
-    # Toggle direction
-    if column == current_column:
-        new_direction = "desc" if current_direction == "asc" else "asc"
-    else:
-        new_direction = "desc"  # default
+@functools.lru_cache(maxsize=32)
+def table_columns(days: int):
+    """DataTable column specs; only the N-day headers depend on ``days``."""
+    columns = []
+    for key, label, fmt in TABLE_COLUMNS:
+        column = {"name": label.format(days=days), "id": key}
+        if fmt is not None:
+            column.update(type="numeric", format=fmt)
+        columns.append(column)
+    return columns
 
-    return column, new_direction
 
-# Callback 5: Generate table with sorting
-@app.callback(
-    Output("table-container", "children"),
-    [Input("stocks-data-store", "data"),
-     Input("industry-filter", "value"),
-     Input("current-days", "data"),
-     Input("sort-column", "data"),
-     Input("sort-direction", "data")]
-)
-def generate_table(stocks_data_store, selected_industry, days, sort_column, sort_direction):
-    """Generate table with stock data and sorting."""
+def table_hash(stocks_data, days: int):
+    """Short digest of a symbol-sorted bundle and the day count it is shown with."""
+    payload = json.dumps([days, stocks_data], sort_keys=True, default=str).encode()
+    return hashlib.blake2b(payload, digest_size=8).hexdigest()
+
+
+def render_table(bundle_key, selected_industry, days, current_hash):
+    """Sortable DataTable for a bundle (sorting happens client-side), plus its hash."""
 
     if not selected_industry:
         return html.Div([
-            html.P("👆 Please select an industry from the dropdown to view stock data", 
-                   style={"color": "#00D4FF", "fontSize": "1.2rem", "textAlign": "center", "marginTop": "50px"})
-        ])
+            html.P("👆 Please select an industry from the dropdown to view stock data", className="table-message hint")
+        ]), None
 
-    stocks_data = stocks_data_store.get(selected_industry, [])
+    stocks_data = (load_bundle(bundle_key) if bundle_key else None) or {}
 
     if not stocks_data:
         return html.Div([
-            html.P("No data loaded yet. Please wait...", 
-                   style={"color": "#888", "fontSize": "1rem", "textAlign": "center", "marginTop": "50px"})
-        ])
-
-    # Use days from store (defaults to 10 if not set)
-    days = days if days and days > 0 else 10
-    
-    # Sort data if sort column is specified
-    if sort_column and stocks_data:
-        # Map column names to data keys
-        column_mapping = {
-            "SYMBOL": "SYMBOL",
-            "INDUSTRIES": "INDUSTRIES",
-            "LAST_CLOSE": "LAST_DAY_CLOSING_PRICE",
-            "OPEN": "TODAY_PRICE_OPEN",
-            "CURRENT": "TODAY_CURRENT_PRICE",
-            "1D_CHANGE": "TODAY_CURRENT_PRICE_CHANGE",
-            "1D_CHANGE_PCT": "TODAY_CURRENT_PRICE_CHANGE_PCT",
-            "ND_PRICE": "HISTORICAL_PRICE",
-            "ND_CHANGE": "HISTORICAL_CHANGE",
-            "ND_CHANGE_PCT": "HISTORICAL_CHANGE_PCT",
-            "52W_HIGH": "52WEEK_HIGH",
-            "52W_LOW": "52WEEK_LOW",
-            "MARKET_CAP": "MARKET_CAP_CR",
-            "PE": "PE",
-            "EPS": "EPS",
-            "AVG_VOLUME": "TODAY_VOLUME_AVERAGE",
-            "TODAY_VOLUME": "TODAY_VOLUME",
-            "VOL_CHANGE_PCT": "VOL_CHANGE_PCT",
-        }
-        
-        data_key = column_mapping.get(sort_column)
-        if data_key:
-            # Sort with None values at the end
-            reverse = (sort_direction == "desc")
-            stocks_data = sorted(
-                stocks_data,
-                key=lambda x: (x.get(data_key) is None, x.get(data_key) if x.get(data_key) is not None else 0),
-                reverse=reverse
-            )
-    
-    def format_value(val, decimals=2):
-        if val is None:
-            return "-"
-        try:
-            v = float(val)
-            return f"{v:,.{decimals}f}"
-        except:
-            return str(val)
-
-    def format_pct(val):
-        if val is None:
-            return "-"
-        try:
-            v = float(val)
-            color = "#00cc66" if v >= 0 else "#ff4d4d"
-            symbol = "▲" if v >= 0 else "▼"
-            return html.Span(f"{symbol} {v:.2f}%", style={"color": color, "fontWeight": "700"})
-        except:
-            return str(val)
-
-    def format_currency(val, decimals=2):
-        if val is None:
-            return "-"
-        try:
-            v = float(val)
-            return f"₹{v:,.{decimals}f}"
-        except:
-            return str(val)
-
-    def format_marketcap(val):
-        if val is None:
-            return "-"
-        try:
-            v = float(val)
-            cr = v / 1e7
-            return f"₹{cr:,.2f}Cr"
-        except:
-            return str(val)
-
-    # Build table
-    rows = []
-    
-    # Helper function to create sortable header
-    def create_header(label, column_key, align="center"):
-        is_sorted = (sort_column == column_key)
-        sort_indicator = " ▼" if sort_direction == "desc" else " ▲" if is_sorted else ""
-
-        return html.Th(
-            html.Button(
-                label + sort_indicator,
-                id={"type": "sort-button", "column": column_key},
-                n_clicks=0,
-                style={
-                    "backgroundColor": "#00D4FF",
-                    "color": "#000",
-                    "fontWeight": "700",
-                    "padding": "10px",
-                    "textAlign": align,
-                    "border": "none",
-                    "cursor": "pointer",
-                    "width": "100%",
-                    "fontSize": "0.9rem"
-                }
-            ),
-            style={"backgroundColor": "#00D4FF", "padding": "0"}
-        )
-
-
-    # Header
-    header_row = html.Tr([
-        create_header("SYMBOL", "SYMBOL", "center"),
-        create_header("INDUSTRIES", "INDUSTRIES", "left"),
-        create_header("LAST CLOSE", "LAST_CLOSE", "right"),
-        create_header("OPEN", "OPEN", "right"),
-        create_header("CURRENT", "CURRENT", "right"),
-        create_header("1D CHANGE", "1D_CHANGE", "right"),
-        create_header("1D CHANGE %", "1D_CHANGE_PCT", "right"),
-        create_header(f"{days}D PRICE", "ND_PRICE", "right"),
-        create_header(f"{days}D CHANGE", "ND_CHANGE", "right"),
-        create_header(f"{days}D CHANGE %", "ND_CHANGE_PCT", "right"),
-        create_header("52W HIGH", "52W_HIGH", "right"),
-        create_header("52W LOW", "52W_LOW", "right"),
-        create_header("MARKET CAP (Cr)", "MARKET_CAP", "right"),
-        create_header("P/E", "PE", "right"),
-        create_header("EPS", "EPS", "right"),
-        create_header("AVG VOLUME", "AVG_VOLUME", "right"),
-        create_header("TODAY VOLUME", "TODAY_VOLUME", "right"),
-        create_header("VOL CHANGE %", "VOL_CHANGE_PCT", "right"),
-    ])
-    rows.append(header_row)
-
-    # Data rows
-    for i, stock in enumerate(stocks_data):
-        row_bg = "#2a2a2a" if i % 2 == 0 else "#1a1a1a"
-        
-        row = html.Tr([
-            html.Td(stock["SYMBOL"], style={"backgroundColor": row_bg, "padding": "8px", "fontWeight": "700", "color": "#00D4FF"}),
-            html.Td(stock["INDUSTRIES"], style={"backgroundColor": row_bg, "padding": "8px", "fontSize": "0.9rem"}),
-            html.Td(format_currency(stock["LAST_DAY_CLOSING_PRICE"]), style={"backgroundColor": row_bg, "padding": "8px", "textAlign": "right"}),
-            html.Td(format_currency(stock["TODAY_PRICE_OPEN"]), style={"backgroundColor": row_bg, "padding": "8px", "textAlign": "right"}),
-            html.Td(format_currency(stock["TODAY_CURRENT_PRICE"]), style={"backgroundColor": row_bg, "padding": "8px", "textAlign": "right", "fontWeight": "700"}),
-            html.Td(format_currency(stock["TODAY_CURRENT_PRICE_CHANGE"]), style={"backgroundColor": row_bg, "padding": "8px", "textAlign": "right"}),
-            html.Td(format_pct(stock["TODAY_CURRENT_PRICE_CHANGE_PCT"]), style={"backgroundColor": row_bg, "padding": "8px", "textAlign": "right"}),
-            html.Td(format_currency(stock.get("HISTORICAL_PRICE")), style={"backgroundColor": row_bg, "padding": "8px", "textAlign": "right", "fontSize": "0.9rem"}),
-            html.Td(format_currency(stock.get("HISTORICAL_CHANGE")), style={"backgroundColor": row_bg, "padding": "8px", "textAlign": "right", "fontSize": "0.9rem"}),
-            html.Td(format_pct(stock.get("HISTORICAL_CHANGE_PCT")), style={"backgroundColor": row_bg, "padding": "8px", "textAlign": "right"}),
-            html.Td(format_currency(stock["52WEEK_HIGH"]), style={"backgroundColor": row_bg, "padding": "8px", "textAlign": "right"}),
-            html.Td(format_currency(stock["52WEEK_LOW"]), style={"backgroundColor": row_bg, "padding": "8px", "textAlign": "right"}),
-            html.Td(format_marketcap(stock["MARKET_CAP_CR"]), style={"backgroundColor": row_bg, "padding": "8px", "textAlign": "right"}),
-            html.Td(format_value(stock["PE"], decimals=2), style={"backgroundColor": row_bg, "padding": "8px", "textAlign": "right"}),
-            html.Td(format_value(stock.get("EPS"), decimals=2), style={"backgroundColor": row_bg, "padding": "8px", "textAlign": "right"}),
-            html.Td(format_value(stock["TODAY_VOLUME_AVERAGE"], decimals=0), style={"backgroundColor": row_bg, "padding": "8px", "textAlign": "right", "fontSize": "0.85rem"}),
-            html.Td(format_value(stock["TODAY_VOLUME"], decimals=0), style={"backgroundColor": row_bg, "padding": "8px", "textAlign": "right", "fontSize": "0.85rem"}),
-            html.Td(format_pct(stock["VOL_CHANGE_PCT"]), style={"backgroundColor": row_bg, "padding": "8px", "textAlign": "right"}),
-        ])
-        rows.append(row)
-
-    return html.Table(
-        [html.Thead(rows[0]), html.Tbody(rows[1:])],
-        style={"width": "100%", "borderCollapse": "collapse", "minWidth": "1200px"}
-    )
+            html.P("No data loaded yet. Please wait...", className="table-message")
+        ]), None
+
+    # Same rows as the table already shows - skip building and sending it again
+    new_hash = table_hash(stocks_data, days)
+    if new_hash == current_hash:
+        return dash.no_update, dash.no_update
+
+    df = coerce_numeric(pd.DataFrame(stocks_data).reindex(columns=TABLE_KEYS), list(TABLE_DECIMALS))
+    df["MARKET_CAP_CR"] /= 1e7
+    df = df.round(TABLE_DECIMALS)
+    # Missing values go out as null so the "-" placeholder renders
+    df = df.astype(object).where(df.notna(), None)
+
+    return dash_table.DataTable(
+        data=df.to_dict("records"),
+        columns=table_columns(days),
+        sort_action="native",
+        page_action="none",
+        virtualization=True,
+        fixed_rows={"headers": True},
+        style_table=TABLE_STYLE,
+        style_header=TABLE_HEADER_STYLE,
+        style_cell=TABLE_CELL_STYLE,
+        style_data_conditional=TABLE_STYLE_DATA_CONDITIONAL,
+    ), new_hash
 
 
 if __name__ == "__main__":
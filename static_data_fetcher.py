@@ -7,9 +7,38 @@ Run this script periodically (e.g., weekly) to update static data
 import pandas as pd
 from nsepython import nse_eq
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 
 
+# Same bucket as aks_market.TokenBucket, copied so this script runs without importing the Dash app
+class RateLimiter:
+    """Token bucket shared by the fetch threads: ``rate`` requests/second, bursts of ``burst``"""
+
+    def __init__(self, rate: float = 3.0, burst: int = 5):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        """Block until a request may be sent"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+            self.tokens -= 1
+            delay = 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+        if delay > 0:
+            time.sleep(delay)
+
+
+# Keeps the combined request rate of all worker threads under NSE's tolerance
+NSE_LIMITER = RateLimiter(rate=3.0, burst=5)
+
+
 def safe_dict(value):
     """Return value if dict, else empty dict"""
     return value if isinstance(value, dict) else {}
@@ -19,7 +48,7 @@ def fetch_industry_for_symbol(symbol: str, max_retries: int = 3):
     """Fetch industry/sector for a single symbol with retry logic"""
     for attempt in range(max_retries):
         try:
-            print(f"  Fetching {symbol}...", end=" ")
+            NSE_LIMITER.wait()
             data = nse_eq(symbol)
             
             if data:
@@ -30,31 +59,33 @@ def fetch_industry_for_symbol(symbol: str, max_retries: int = 3):
                     industry_info.get("basicIndustry") or
                     "N/A"
                 )
-                print(f"✓ {sector}")
+                print(f"  {symbol}: ✓ {sector}")
                 return sector
             else:
-                print("✗ No data")
+                print(f"  {symbol}: ✗ No data")
                 return "N/A"
                 
         except Exception as e:
             if attempt < max_retries - 1:
-                print(f"⚠ Retry {attempt + 1}/{max_retries}")
+                print(f"  {symbol}: ⚠ Retry {attempt + 1}/{max_retries}")
                 time.sleep(1 * (attempt + 1))  # Exponential backoff
             else:
-                print(f"✗ Failed: {e}")
+                print(f"  {symbol}: ✗ Failed: {e}")
                 return "N/A"
     
     return "N/A"
 
 
 def load_and_enrich_tickers(input_csv: str = "nifty100.csv", 
-                           output_csv: str = "nifty100_with_industries.csv"):
+                           output_csv: str = "nifty100_with_industries.csv",
+                           workers: int = 8):
     """
     Load tickers from CSV, fetch their industries, and save enriched data
     
     Args:
         input_csv: Input CSV file with 'ticker' column
         output_csv: Output CSV file with ticker and industry columns
+        workers: Number of parallel fetch threads (NSE_LIMITER caps the request rate)
     """
     
     print("=" * 60)
@@ -84,27 +115,22 @@ def load_and_enrich_tickers(input_csv: str = "nifty100.csv",
     print(f"✓ Found {len(symbols)} unique symbols")
     print(f"\nFetching industry data...\n")
     
-    # Fetch industry for each symbol
-    results = []
+    # Fetch industries in parallel; the shared rate limiter replaces the
+    # fixed cool-down pauses
+    industries = {}
     
-    for i, symbol in enumerate(symbols, 1):
-        print(f"[{i}/{len(symbols)}]", end=" ")
-        
-        industry = fetch_industry_for_symbol(symbol)
-        
-        results.append({
-            "ticker": f"NSE:{symbol}",
-            "symbol": symbol,
-            "industry": industry
-        })
-        
-        # Rate limiting: pause after every 10 requests
-        if i % 10 == 0:
-            print(f"\n  ⏳ Progress: {i}/{len(symbols)} completed. Cooling down...\n")
-            time.sleep(2)
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        futures = {ex.submit(fetch_industry_for_symbol, symbol): symbol for symbol in symbols}
+        for i, fut in enumerate(as_completed(futures), 1):
+            industries[futures[fut]] = fut.result()
+            if i % 10 == 0:
+                print(f"\n  ⏳ Progress: {i}/{len(symbols)} completed\n")
     
-    # Create DataFrame and save
-    result_df = pd.DataFrame(results)
+    # Create DataFrame (in input order, so the CSV diff stays stable) and save
+    result_df = pd.DataFrame([
+        {"ticker": f"NSE:{symbol}", "symbol": symbol, "industry": industries[symbol]}
+        for symbol in symbols
+    ])
     
     # Summary statistics
     print("\n" + "=" * 60)